@@ -3,13 +3,16 @@ Modern A2A/MCP Client GUI using PySide6
 Run with: python A2A/a2a_client_gui_qt.py
 """
 import sys
-import json
-import requests
+import orjson
+import asyncio
+import threading
+import httpx
 from PySide6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QLineEdit,
     QPushButton, QTextEdit, QFormLayout, QMessageBox, QSizePolicy
 )
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt, QObject, Signal
+from PySide6.QtGui import QTextCursor
 
 A2A_URL = "http://localhost:9000/a2a"
 MCP_URL = "http://localhost:8090/mcp/"
@@ -20,74 +23,110 @@ MCP_TOOLS = {
     "list_coffee_types": []
 }
 A2A_SKILLS = ["triage", "math", "history", "coffee"]
+MCP_HEADERS = {"Content-Type": "application/json", "Accept": "application/json, text/event-stream"}
+# Accepting an event stream lets the A2A server send the answer as it is generated.
+A2A_HEADERS = MCP_HEADERS
+# Only the tool name and arguments change between MCP calls. They are filled in
+# and serialized with no await in between, so concurrent requests on the loop
+# never see each other's values.
+_MCP_CALL = {
+    "jsonrpc": "2.0",
+    "method": "tools/call",
+    "params": {"name": None, "arguments": None},
+    "id": "1"
+}
 
-class Worker(QThread):
-    resultReady = Signal(object)
-    def __init__(self, mode, skill, tool, args):
-        super().__init__()
-        self.mode = mode
-        self.skill = skill
-        self.tool = tool
-        self.args = args
-    def run(self):
-        try:
-            if self.mode == "A2A":
-                if self.skill == "triage":
-                    params = {"query": self.args.get("question", "")}
-                else:
-                    params = {"question": self.args.get("question", "")}
-                payload = {
-                    "jsonrpc": "2.0",
-                    "method": self.skill,
-                    "params": params,
-                    "id": "1"
-                }
-                response = requests.post(A2A_URL, json=payload, timeout=10)
+async def fetch_response(client, mode, skill, tool, args, on_chunk=None):
+    try:
+        if mode == "A2A":
+            if skill == "triage":
+                params = {"query": args.get("question", "")}
+            else:
+                params = {"question": args.get("question", "")}
+            payload = {
+                "jsonrpc": "2.0",
+                "method": skill,
+                "params": params,
+                "id": "1"
+            }
+            async with client.stream("POST", A2A_URL, content=orjson.dumps(payload), headers=A2A_HEADERS) as response:
                 response.raise_for_status()
-                data = response.json()
-                if "result" in data:
-                    val = next(iter(data["result"].values()))
-                    self.resultReady.emit(val)
-                elif "error" in data:
-                    self.resultReady.emit(f"Error: {data['error']['message']}")
-                else:
-                    self.resultReady.emit("Unknown response format.")
+                if "text/event-stream" in response.headers.get("Content-Type", ""):
+                    # Each event carries the next piece of the answer.
+                    parts = []
+                    async for line in response.aiter_lines():
+                        if line.startswith("data: "):
+                            data = orjson.loads(line[6:])
+                            if "error" in data:
+                                return f"Error: {data['error']['message']}"
+                            piece = next(iter(data["result"].values()))
+                            parts.append(piece)
+                            if on_chunk is not None:
+                                on_chunk(piece)
+                    return "".join(parts)
+                data = orjson.loads(await response.aread())
+            if "result" in data:
+                return next(iter(data["result"].values()))
+            elif "error" in data:
+                return f"Error: {data['error']['message']}"
             else:
-                payload = {
-                    "jsonrpc": "2.0",
-                    "method": "tools/call",
-                    "params": {
-                        "name": self.tool,
-                        "arguments": self.args
-                    },
-                    "id": "1"
-                }
-                headers = {"Accept": "application/json, text/event-stream"}
-                response = requests.post(MCP_URL, json=payload, headers=headers, timeout=10)
+                return "Unknown response format."
+        else:
+            _MCP_CALL["params"]["name"] = tool
+            _MCP_CALL["params"]["arguments"] = args
+            body = orjson.dumps(_MCP_CALL)
+            async with client.stream("POST", MCP_URL, content=body, headers=MCP_HEADERS) as response:
                 response.raise_for_status()
                 content_type = response.headers.get("Content-Type", "")
                 if "text/event-stream" in content_type:
-                    lines = response.text.splitlines()
-                    data_lines = [line[6:] for line in lines if line.startswith("data: ")]
-                    if data_lines:
-                        data = json.loads(data_lines[-1])
-                    else:
-                        self.resultReady.emit("No data received in event stream.")
-                        return
+                    # Read events as they arrive and stop at the JSON-RPC response;
+                    # anything before it is a notification.
+                    data = None
+                    async for line in response.aiter_lines():
+                        if line.startswith("data: "):
+                            data = orjson.loads(line[6:])
+                            if "result" in data or "error" in data:
+                                break
+                    if data is None:
+                        return "No data received in event stream."
                 else:
-                    data = response.json()
-                if "result" in data:
-                    content = data["result"].get("content")
-                    if isinstance(content, list) and content and "text" in content[0]:
-                        self.resultReady.emit(content[0]["text"])
-                    else:
-                        self.resultReady.emit(json.dumps(data["result"], indent=2))
-                elif "error" in data:
-                    self.resultReady.emit(f"Error: {data['error']['message']}")
+                    data = orjson.loads(await response.aread())
+            if "result" in data:
+                content = data["result"].get("content")
+                if isinstance(content, list) and content and "text" in content[0]:
+                    return content[0]["text"]
                 else:
-                    self.resultReady.emit("Unknown response format.")
-        except Exception as e:
-            self.resultReady.emit(f"Request failed: {e}")
+                    return orjson.dumps(data["result"], option=orjson.OPT_INDENT_2).decode()
+            elif "error" in data:
+                return f"Error: {data['error']['message']}"
+            else:
+                return "Unknown response format."
+    except Exception as e:
+        return f"Request failed: {e}"
+
+# One asyncio loop on a background thread; every request shares its pooled HTTP client.
+class RequestLoop(QObject):
+    resultReady = Signal(object)
+    chunkReady = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.loop = asyncio.new_event_loop()
+        self.client = httpx.AsyncClient(timeout=10)
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, mode, skill, tool, args):
+        future = asyncio.run_coroutine_threadsafe(
+            fetch_response(self.client, mode, skill, tool, args, self.chunkReady.emit), self.loop
+        )
+        # Runs on the loop thread; Qt queues the signal to the GUI thread.
+        future.add_done_callback(lambda f: self.resultReady.emit(f.result()))
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
 
 class A2AClientGUI(QWidget):
     def __init__(self):
@@ -95,7 +134,10 @@ class A2AClientGUI(QWidget):
         self.setWindowTitle("A2A/MCP Agent Client (Modern)")
         self.setMinimumSize(650, 500)
         self.mode = "A2A"
-        self.worker = None  # Store the worker thread
+        self.requests = RequestLoop()
+        self.requests.resultReady.connect(self.display_response)
+        self.requests.chunkReady.connect(self.display_chunk)
+        self.streaming = False
         self.init_ui()
 
     def init_ui(self):
@@ -118,8 +160,14 @@ class A2AClientGUI(QWidget):
         self.tool_combo = QComboBox()
         self.tool_combo.addItems(list(MCP_TOOLS.keys()))
         self.tool_combo.currentTextChanged.connect(self.update_tool_args)
-        # Dynamic argument fields
+        # Argument fields for every tool are built once and shown per tool
         self.form_layout = QFormLayout()
+        self.arg_rows = {}
+        for arg in dict.fromkeys(arg for args in MCP_TOOLS.values() for arg in args):
+            label = QLabel(f"{arg.capitalize()}:")
+            entry = QLineEdit()
+            self.form_layout.addRow(label, entry)
+            self.arg_rows[arg] = (label, entry)
         self.arg_widgets = {}
         # Question entry (A2A)
         self.question_label = QLabel("Enter your question:")
@@ -158,11 +206,10 @@ class A2AClientGUI(QWidget):
             self.question_entry.show()
             self.tool_label.hide()
             self.tool_combo.hide()
-            # Clear MCP tool args
-            for i in reversed(range(self.form_layout.count())):
-                item = self.form_layout.itemAt(i)
-                if item.widget():
-                    item.widget().deleteLater()
+            # Hide MCP tool args
+            for label, entry in self.arg_rows.values():
+                label.hide()
+                entry.hide()
             self.arg_widgets = {}
         else:
             self.skill_label.hide()
@@ -178,19 +225,13 @@ class A2AClientGUI(QWidget):
         pass
 
     def update_tool_args(self):
-        # Remove old widgets
-        for i in reversed(range(self.form_layout.count())):
-            item = self.form_layout.itemAt(i)
-            if item.widget():
-                item.widget().deleteLater()
-        self.arg_widgets = {}
         tool = self.tool_combo.currentText()
         args = MCP_TOOLS.get(tool, [])
-        for arg in args:
-            label = QLabel(f"{arg.capitalize()}:")
-            entry = QLineEdit()
-            self.form_layout.addRow(label, entry)
-            self.arg_widgets[arg] = entry
+        for arg, (label, entry) in self.arg_rows.items():
+            visible = arg in args
+            label.setVisible(visible)
+            entry.setVisible(visible)
+        self.arg_widgets = {arg: self.arg_rows[arg][1] for arg in args}
 
     def ask_agent(self):
         self.ask_button.setEnabled(False)
@@ -204,7 +245,7 @@ class A2AClientGUI(QWidget):
                 self.ask_button.setEnabled(True)
                 return
             args = {"question": question}
-            self.worker = Worker(mode, skill, None, args)
+            self.requests.submit(mode, skill, None, args)
         else:
             tool = self.tool_combo.currentText()
             args = {k: w.text().strip() for k, w in self.arg_widgets.items()}
@@ -212,17 +253,24 @@ class A2AClientGUI(QWidget):
                 self.response_text.setPlainText("Please fill in all tool arguments.")
                 self.ask_button.setEnabled(True)
                 return
-            self.worker = Worker(mode, None, tool, args)
-        self.worker.resultReady.connect(self.display_response)
-        self.worker.finished.connect(lambda: self.ask_button.setEnabled(True))
-        self.worker.finished.connect(self.cleanup_worker)
-        self.worker.start()
+            self.requests.submit(mode, None, tool, args)
 
-    def cleanup_worker(self):
-        self.worker = None
+    def display_chunk(self, chunk):
+        # The first piece replaces the "Waiting for response..." placeholder.
+        if not self.streaming:
+            self.streaming = True
+            self.response_text.clear()
+        self.response_text.moveCursor(QTextCursor.End)
+        self.response_text.insertPlainText(chunk)
 
     def display_response(self, text):
+        self.streaming = False
         self.response_text.setPlainText(str(text))
+        self.ask_button.setEnabled(True)
+
+    def closeEvent(self, event):
+        self.requests.close()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
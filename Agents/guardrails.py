@@ -0,0 +1,236 @@
+import asyncio
+import re
+import threading
+
+from agent_backend import InputGuardrail, GuardrailFunctionOutput
+
+# --- Security Constants and Checks ---
+MAX_INPUT_LENGTH = 500
+DIGIT_PII_PATTERNS = [
+    # Digit runs are delimited by (?:^|\W) ... (?:\W|$) rather than \b, which
+    # re2 cannot express for non-ASCII text; see _re2_classes.
+    r"(?:^|\W)\d{3}-\d{2}-\d{4}(?:\W|$)",  # SSN
+    r"(?:^|\W)(?:\d{5}|\d{10})(?:\W|$)",  # Zip code or 10-digit phone (expand as needed)
+]
+EMAIL_PII_PATTERNS = [
+    # Email; the local part must start a run so search() cannot rescan long
+    # runs of address characters from every offset.
+    r"(?:^|[^a-zA-Z0-9_.+-])[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+",
+]
+PII_PATTERNS = DIGIT_PII_PATTERNS + EMAIL_PII_PATTERNS
+TOXIC_WORDS = ["badword1", "badword2", "hate", "kill", "stupid"]  # Expand as needed
+# Plain lowercase phrases rather than regexes, so they can share the toxic-word
+# matcher below.
+JAILBREAK_PHRASES = [
+    "ignore previous instructions",
+    "pretend to be",
+    "disregard your guidelines",
+    "repeat this prompt",
+    "system prompt",
+]
+
+# RE2 matches in linear time, so crafted input cannot make the digit-run
+# patterns backtrack. Everything that matches letters stays on re, because
+# RE2's case folding is narrower: under (?i) re also matches "ı", "ſ" and the
+# Kelvin sign to ASCII letters, so "nazlı@x.com" is an email address and
+# "ıgnore previous instructions" a jailbreak. The fixed phrases cannot
+# backtrack at all, and the email pattern is anchored to avoid rescans.
+try:
+    import re2 as _guard_re
+    RE2_AVAILABLE = True
+except ImportError:
+    _guard_re = re
+    RE2_AVAILABLE = False
+
+# RE2's \d and \W are ASCII-only, where re's cover all of Unicode. Spelling
+# them as Unicode classes keeps the PII patterns flagging the same text, such
+# as Arabic-Indic digit runs, under either engine.
+def _re2_classes(pattern):
+    return pattern.replace(r"\d", r"\p{Nd}").replace(r"\W", r"[^\p{L}\p{N}_]")
+
+def _combine_patterns(patterns, ignore_case=False, engine=re):
+    # One alternation per group so each check scans the input once. An empty
+    # group must match nothing rather than everything.
+    combined = "|".join(f"(?:{pattern})" for pattern in patterns) or r"[^\s\S]"
+    if ignore_case:
+        combined = f"(?i){combined}"
+    if engine is not re:
+        combined = _re2_classes(combined)
+    return engine.compile(combined)
+
+# Every category in one screen: benign input is cleared in a single scan, and
+# only input that hits something is re-checked per category, in priority
+# order, to report the right reason. The screen matches toxic words
+# case-insensitively, so it is looser than the toxic check ("Kıll" hits the
+# screen but not "kill" in the lowered text); a hit no check confirms passes.
+# With RE2 the digit-run patterns and the
+# rest run on different engines, so the screen is those two scans.
+_PHRASE_PATTERNS = [re.escape(phrase) for phrase in JAILBREAK_PHRASES + TOXIC_WORDS]
+_SCREEN_PATTERNS = PII_PATTERNS + _PHRASE_PATTERNS
+if RE2_AVAILABLE:
+    _DIGIT_PII_RE = _combine_patterns(DIGIT_PII_PATTERNS, engine=_guard_re)
+    _EMAIL_PII_RE = _combine_patterns(EMAIL_PII_PATTERNS, ignore_case=True)
+    _TEXT_SCREEN_RE = _combine_patterns(EMAIL_PII_PATTERNS + _PHRASE_PATTERNS, ignore_case=True)
+
+    def _pii_search(text):
+        return _DIGIT_PII_RE.search(text) is not None or _EMAIL_PII_RE.search(text) is not None
+
+    def _pattern_screen(text):
+        return _DIGIT_PII_RE.search(text) is not None or _TEXT_SCREEN_RE.search(text) is not None
+else:
+    _PII_RE = _combine_patterns(PII_PATTERNS, ignore_case=True)
+    _PATTERN_SCREEN_RE = _combine_patterns(_SCREEN_PATTERNS, ignore_case=True)
+
+    def _pii_search(text):
+        return _PII_RE.search(text) is not None
+
+    def _pattern_screen(text):
+        return _PATTERN_SCREEN_RE.search(text) is not None
+
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+if HYPERSCAN_AVAILABLE and _SCREEN_PATTERNS:
+    # Hyperscan's case folding and character classes agree with re's only on
+    # ASCII, so it screens ASCII text (nearly all input) and anything else
+    # goes through the regex screen; the screen never misses what the
+    # per-category checks would flag.
+    _SCREEN_DB = hyperscan.Database()
+    _SCREEN_DB.compile(
+        expressions=[pattern.encode() for pattern in _SCREEN_PATTERNS],
+        ids=list(range(len(_SCREEN_PATTERNS))),
+        elements=len(_SCREEN_PATTERNS),
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(_SCREEN_PATTERNS),
+    )
+    # The database's scratch space cannot serve two scans at once, and the A2A
+    # loop and the MCP thread both run the guardrail.
+    _SCREEN_LOCK = threading.Lock()
+
+    def _screen_input(text):
+        if not text.isascii():
+            return _pattern_screen(text)
+        data = text.encode("ascii")
+
+        def on_match(pattern_id, start, end, flags, context):
+            return True  # stop at the first hit
+
+        # Stopping early is reported as ScanTerminated, which here means a hit.
+        try:
+            with _SCREEN_LOCK:
+                _SCREEN_DB.scan(data, match_event_handler=on_match)
+        except hyperscan.ScanTerminated:
+            return True
+        return False
+else:
+    _screen_input = _pattern_screen
+
+# Every PII pattern needs a digit or an "@", so text with neither skips the
+# PII alternation; the hint scan stops at the first candidate character.
+_PII_HINT_RE = _combine_patterns([r"[\d@]"], engine=_guard_re)
+
+def contains_pii(text):
+    return _PII_HINT_RE.search(text) is not None and _pii_search(text)
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Toxic words and jailbreak phrases are fixed strings. Toxic words are found
+# in the lowercased text; jailbreak phrases match case-insensitively, which
+# also catches Unicode variants that lower() leaves alone ("ſystem prompt").
+# The automaton, when available, finds both categories in one pass over the
+# lowercased text, and a jailbreak it misses is confirmed with the
+# case-insensitive regex on the original text.
+_TOXIC_RE = _combine_patterns(re.escape(word.lower()) for word in TOXIC_WORDS)
+_JAILBREAK_RE = _combine_patterns((re.escape(phrase) for phrase in JAILBREAK_PHRASES), ignore_case=True)
+
+_PHRASE_CATEGORIES = {}
+for _word in TOXIC_WORDS:
+    _PHRASE_CATEGORIES.setdefault(_word.lower(), set()).add("toxic")
+for _phrase in JAILBREAK_PHRASES:
+    _PHRASE_CATEGORIES.setdefault(_phrase.lower(), set()).add("jailbreak")
+
+# An automaton with no words cannot be searched, so that case uses the regexes.
+if AHOCORASICK_AVAILABLE and _PHRASE_CATEGORIES:
+    _PHRASE_AUTOMATON = ahocorasick.Automaton()
+    for _phrase, _categories in _PHRASE_CATEGORIES.items():
+        _PHRASE_AUTOMATON.add_word(_phrase, frozenset(_categories))
+    _PHRASE_AUTOMATON.make_automaton()
+
+    def _automaton_categories(lowered_text):
+        found = set()
+        for _, categories in _PHRASE_AUTOMATON.iter(lowered_text):
+            found |= categories
+        return found
+else:
+    def _automaton_categories(lowered_text):
+        return set()
+
+def phrase_categories(text):
+    lowered = text.lower()
+    found = _automaton_categories(lowered)
+    if "toxic" not in found and _TOXIC_RE.search(lowered) is not None:
+        found.add("toxic")
+    if "jailbreak" not in found and _JAILBREAK_RE.search(text) is not None:
+        found.add("jailbreak")
+    return found
+
+def contains_toxicity(text):
+    return _TOXIC_RE.search(text.lower()) is not None
+
+def contains_jailbreak(text):
+    return _JAILBREAK_RE.search(text) is not None
+
+# Extra async checks (e.g. a remote moderation call). Each takes the input text
+# and returns a tripwire message, or None to pass. They run concurrently after
+# the local checks, so the guardrail costs the slowest one rather than the sum.
+ASYNC_SECURITY_CHECKS = []
+
+async def security_guardrail(ctx, agent, input_data):
+    if len(input_data) > MAX_INPUT_LENGTH:
+        return GuardrailFunctionOutput(
+            output_info="Input too long.",
+            tripwire_triggered=True,
+        )
+    if not input_data:
+        return GuardrailFunctionOutput(
+            output_info="Input passed security checks.",
+            tripwire_triggered=False,
+        )
+    if _screen_input(input_data):
+        if contains_pii(input_data):
+            return GuardrailFunctionOutput(
+                output_info="Input contains PII.",
+                tripwire_triggered=True,
+            )
+        categories = phrase_categories(input_data)
+        if "toxic" in categories:
+            return GuardrailFunctionOutput(
+                output_info="Input contains harmful or toxic content.",
+                tripwire_triggered=True,
+            )
+        if "jailbreak" in categories:
+            return GuardrailFunctionOutput(
+                output_info="Input appears to be a jailbreak or prompt injection attempt.",
+                tripwire_triggered=True,
+            )
+    if ASYNC_SECURITY_CHECKS:
+        results = await asyncio.gather(*(check(input_data) for check in ASYNC_SECURITY_CHECKS))
+        for message in results:
+            if message is not None:
+                return GuardrailFunctionOutput(
+                    output_info=message,
+                    tripwire_triggered=True,
+                )
+    return GuardrailFunctionOutput(
+        output_info="Input passed security checks.",
+        tripwire_triggered=False,
+    )
+
+# The guardrail is stateless, so every agent shares the same wrapper.
+SECURITY_GUARDRAILS = [InputGuardrail(guardrail_function=security_guardrail)]
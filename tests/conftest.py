@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules in Agents/ import each other by bare name, as they do when run
+# from that directory.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Agents"))
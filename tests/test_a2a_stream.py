@@ -0,0 +1,19 @@
+import orjson
+from fastapi.testclient import TestClient
+from openai import OpenAIError
+
+import agent_backend
+import agents
+
+
+def test_stream_failure_ends_with_jsonrpc_error(monkeypatch):
+    async def classify(question):
+        raise OpenAIError("no API key")
+
+    monkeypatch.setattr(agent_backend, "classify_question_type", classify)
+    payload = {"jsonrpc": "2.0", "method": "triage", "params": {"query": "Tell me something"}, "id": 3}
+    with TestClient(agents.app) as client:
+        response = client.post("/a2a", json=payload, headers={"Accept": "text/event-stream"})
+    assert response.status_code == 200
+    events = [orjson.loads(line[6:]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events == [{"jsonrpc": "2.0", "error": {"code": -32603, "message": "Internal error"}, "id": 3}]
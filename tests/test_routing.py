@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import agent_backend
+from agent_backend import Agent, Runner, keyword_route
+
+
+@pytest.mark.parametrize("question", [
+    "Tell me about twenty-first-century art",
+    "Can I get an e-mail template?",
+    "How are you today?",
+    "Is it ok to eat now?",
+    "How do I fix my car clock?",
+    "What is the capital of France?",
+    "Where can I buy coffee",
+    "Tell me about Europe 1939-1945",
+    "Who won the 1966-67 season?",
+    "Summarize chapters 3-5 of Dracula",
+    "Explain Psalm 23:1-6",
+])
+def test_weak_keywords_leave_routing_to_classifier(question):
+    assert keyword_route(question) is None
+
+
+@pytest.mark.parametrize("question, subject", [
+    ("What is 2+2", "math"),
+    ("What is 12 / 4?", "math"),
+    ("What is 12 - 4?", "math"),
+    ("12-4=?", "math"),
+    ("calculate 12-4", "math"),
+    ("What time is it in Tokyo?", "time"),
+    ("Explain photosynthesis and mitosis in a cell", "biology"),
+    ("Who won the battle of Hastings in the war?", "history"),
+    ("What is a latte vs a cappuccino?", "coffee"),
+])
+def test_clear_keywords_route_directly(question, subject):
+    assert keyword_route(question) == subject
+
+
+def test_small_talk_is_not_sent_to_time_agent(monkeypatch):
+    async def classify(question):
+        return "unknown"
+
+    monkeypatch.setattr(agent_backend, "classify_question_type", classify)
+    time_agent = Agent(name="Time Agent", instructions="")
+    triage = Agent(name="Triage Agent", instructions="", handoffs=[time_agent])
+    agents_used = []
+    routed, message = asyncio.run(Runner.route(triage, "How are you today?", agents_used))
+    assert routed is None
+    assert message
+    assert agents_used == ["Triage Agent"]
+
+
+def test_classifier_gets_original_question_and_caches_normalized(monkeypatch):
+    sent = []
+
+    class Responses:
+        async def create(self, **kwargs):
+            sent.append(kwargs["input"])
+            return type("Response", (), {"output_text": " Math "})()
+
+    client = type("Client", (), {"responses": Responses()})()
+    monkeypatch.setattr(agent_backend, "get_async_client", lambda: client)
+    monkeypatch.setattr(agent_backend, "_classify_cache", agent_backend.LRUCache(16))
+
+    async def classify_both():
+        first = await agent_backend.classify_question_type("What  is Pi?")
+        second = await agent_backend.classify_question_type("what is pi?")
+        return first, second
+
+    assert asyncio.run(classify_both()) == ("math", "math")
+    assert sent == ['Question: "What  is Pi?"\nType:']